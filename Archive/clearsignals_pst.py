@@ -11,8 +11,9 @@ USAGE:
   py clearsignals_pst.py "C:\path\to\your\file.pst"
 
 ENV VARS (set these before running):
-  OPENROUTER_API_KEY   - Your OpenRouter API key
-  OPENROUTER_MODEL_ID  - Model to use (default: anthropic/claude-sonnet-4-20250514)
+  OPENROUTER_API_KEY        - Your OpenRouter API key
+  OPENROUTER_MODEL_ID       - Model to use (default: anthropic/claude-sonnet-4-20250514)
+  OPENROUTER_CHEAP_MODEL_ID - Model for short threads (default: anthropic/claude-3.5-haiku)
 
 OUTPUT:
   clearsignals_profiles.json - Anonymized interaction profiles
@@ -25,9 +26,17 @@ import json
 import hashlib
 import re
 import time
+import mmap
+import heapq
+import shelve
+import asyncio
+import threading
 from datetime import datetime, timezone
-from collections import defaultdict
+from collections import defaultdict, deque, Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from email.utils import parseaddr, parsedate_to_datetime
+from functools import lru_cache
 from pathlib import Path
 
 try:
@@ -46,18 +55,100 @@ except ImportError:
     print("    pip install requests")
     sys.exit(1)
 
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None  # Optional - enables concurrent analysis (pip install aiohttp)
+
+try:
+    import diskcache
+except ImportError:
+    diskcache = None  # Optional - caches LLM responses across runs (pip install diskcache)
+
+try:
+    from lxml import html as lxml_html
+except ImportError:
+    lxml_html = None  # Optional - proper HTML-to-text in C (pip install lxml)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # Optional - fast C JSON encoder for output files (pip install orjson)
+
+try:
+    import tiktoken
+    _ENC = tiktoken.get_encoding("cl100k_base")  # close proxy for chat models
+except ImportError:
+    _ENC = None  # Optional - token-accurate prompt budgeting (pip install tiktoken)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Optional - vectorized score aggregation (pip install numpy)
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None  # Optional - JIT-compiled score aggregation (pip install numba)
+
 # ═══════════════════════════════════════════════════════════════
 # CONFIG
 # ═══════════════════════════════════════════════════════════════
 
 API_KEY = os.environ.get("OPENROUTER_API_KEY", "")
 MODEL_ID = os.environ.get("OPENROUTER_MODEL_ID", "anthropic/claude-sonnet-4-20250514")
+
+# Two-tier routing: short sales-touch threads go to a cheaper model,
+# long/complex threads escalate to the premium MODEL_ID.
+CHEAP_MODEL_ID = os.environ.get("OPENROUTER_CHEAP_MODEL_ID", "anthropic/claude-3.5-haiku")
+CHEAP_MAX_EMAILS = 4         # Threads this short route to the cheap model...
+CHEAP_MAX_BYTES = 3072       # ...as do threads with less total body text
 API_URL = "https://openrouter.ai/api/v1/chat/completions"
+API_BASE = API_URL.rsplit("/chat/completions", 1)[0]
+
+# Batch API mode: ~50% cheaper per token, results within 24h instead of live.
+# Opt-in because not every OpenAI-compatible provider supports /batches.
+BATCH_MODE = os.environ.get("CLEARSIGNALS_BATCH", "") == "1"
+BATCH_POLL_SECONDS = 30
+
+CONTEXT_TOKENS = 16000       # Input-token budget per request (conservative)
+OUTPUT_RESERVE_TOKENS = 2000  # Matches max_tokens in the request body
+EMAIL_TOKEN_CAP = 500        # Per-email body cap in prompts (~2000 ASCII chars)
+BODY_TOKEN_CAP = 1250        # Stored body cap at extraction (~5000 ASCII chars)
 
 MAX_CONTACTS = 50          # Max contacts to analyze (top by email count)
 MAX_THREADS_PER_CONTACT = 5  # Analyze last N threads per contact
 MAX_EMAILS_PER_THREAD = 20   # Cap thread length
-RATE_LIMIT_SECONDS = 1.5     # Pause between API calls
+# Pack several threads into one LLM request (pays the system prompt once
+# per batch). 1 = one thread per call.
+THREADS_PER_CALL = int(os.environ.get("CLEARSIGNALS_THREADS_PER_CALL", "1") or 1)
+
+MAX_CONCURRENT_REQUESTS = 10  # Parallel API calls when aiohttp is available
+REQUESTS_PER_SECOND = 4.0    # Initial request rate; AIMD adjusts from here
+MIN_REQUESTS_PER_SECOND = 0.2
+MAX_REQUESTS_PER_SECOND = 20.0
+API_RETRIES = 3              # Retry attempts per thread analysis
+CACHE_DIR = ".cs_cache"      # On-disk LLM response cache
+CACHE_TTL_SECONDS = 30 * 86400
+
+# Parse top-level PST folders in parallel worker processes (each worker
+# opens its own read-only pypff handle). 0/1 = serial.
+PST_WORKERS = int(os.environ.get("CLEARSIGNALS_WORKERS", "0") or 0)
+
+# One pooled session for all sync HTTP: keeps TCP+TLS connections alive
+# across calls and retries transient provider errors with backoff.
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+SESSION = requests.Session()
+SESSION.headers.update({
+    "Authorization": f"Bearer {API_KEY}",
+    "Content-Type": "application/json"
+})
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16, pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=1,
+                      status_forcelist=[429, 500, 502, 503, 504])))
 
 # ═══════════════════════════════════════════════════════════════
 # SYSTEM PROMPT
@@ -107,9 +198,29 @@ Return ONLY this JSON (no other text):
 # PST PARSING
 # ═══════════════════════════════════════════════════════════════
 
-def sha256(text):
-    """One-way hash for PII stripping."""
-    return hashlib.sha256(text.lower().strip().encode()).hexdigest()[:16]
+# Compiled once - these run on every message of a potentially huge PST.
+_RE_REPLY_PREFIX = re.compile(r'^(re|fw|fwd|aw|wg)\s*:\s*', re.IGNORECASE)
+_RE_HTML_TAG = re.compile(r'<[^>]+>')
+_RE_WS = re.compile(r'\s+')
+
+# Common non-email folders, matched case-insensitively in one C-level scan
+_SKIP_FOLDER_RE = re.compile(r'calendar|contacts|tasks|notes|journal|junk|deleted',
+                             re.IGNORECASE)
+
+# Code fences around LLM JSON responses
+_RE_FENCE_OPEN = re.compile(r'^```json\s*')
+_RE_FENCE_CLOSE = re.compile(r'\s*```$')
+
+@lru_cache(maxsize=65536)
+def hash_id(text):
+    """One-way ID hash for PII stripping. Cached - the same contact emails,
+    domains, and subjects get hashed repeatedly across profiles.
+
+    blake2b with digest_size=8 yields the same 16-hex-char IDs as the old
+    truncated SHA-256 with a shorter finalize path; these IDs are
+    anonymization labels, not security material.
+    """
+    return hashlib.blake2b(text.lower().strip().encode(), digest_size=8).hexdigest()
 
 def safe_str(val):
     """Safely convert PST field to string."""
@@ -118,16 +229,33 @@ def safe_str(val):
     if isinstance(val, bytes):
         try:
             return val.decode("utf-8", errors="replace")
-        except:
+        except Exception:
             return str(val)
     return str(val)
 
+@lru_cache(maxsize=200_000)
 def parse_email_address(raw):
-    """Extract email address from 'Name <email>' format."""
+    """Extract email address from 'Name <email>' format. Cached - the same
+    sender/recipient strings repeat across thousands of emails."""
     if not raw:
         return ""
-    name, addr = parseaddr(raw)
-    return addr.lower().strip() if addr else raw.lower().strip()
+    s = raw.strip()
+    # Fast path: already a bare address - skip parseaddr's RFC 2822 parse
+    if '<' not in s and ' ' not in s and '@' in s:
+        return s.lower()
+    name, addr = parseaddr(s)
+    return addr.lower().strip() if addr else s.lower()
+
+@lru_cache(maxsize=50_000)
+def _iso_from_ts(ts):
+    """Epoch float -> ISO-8601 string, or None.
+
+    Cached: bulk-imported mail shares delivery timestamps, so the same
+    value gets formatted many times across threads.
+    """
+    if not ts:
+        return None
+    return datetime.fromtimestamp(ts).isoformat()
 
 def parse_date(msg):
     """Try to extract a datetime from a PST message."""
@@ -135,178 +263,306 @@ def parse_date(msg):
         dt = msg.get_delivery_time()
         if dt:
             return dt
-    except:
+    except Exception:
         pass
     try:
         dt = msg.get_creation_time()
         if dt:
             return dt
-    except:
+    except Exception:
         pass
     return None
 
-def extract_messages(pst_path):
-    """Extract all messages from a PST file."""
-    print(f"\n[*] Opening PST file: {pst_path}")
+def strip_html(html_body):
+    """Convert an HTML email body to analysis text.
+
+    Prefers lxml, which parses in C, decodes entities, and drops
+    script/style blocks (all of which the regex path gets wrong and
+    feeds to the LLM as junk tokens). Falls back to the tag-strip regex.
+    """
+    if lxml_html is not None:
+        try:
+            tree = lxml_html.fromstring(html_body)
+            for el in tree.iter("script", "style"):
+                el.drop_tree()
+            return _RE_WS.sub(' ', tree.text_content()).strip()
+        except Exception:
+            pass
+    return _RE_WS.sub(' ', _RE_HTML_TAG.sub(' ', html_body)).strip()
+
+@contextmanager
+def open_pst(pst_path):
+    """Open a PST with the file memory-mapped so libpff's many small random
+    reads hit page-cache-backed memory instead of per-read syscalls.
+    Falls back to the plain open path if mapping fails.
+
+    Context manager: the libpff handle (and any backing mmap) is closed
+    even when extraction raises partway through.
+    """
     pst = pypff.file()
-    pst.open(pst_path)
-    
-    root = pst.get_root_folder()
-    messages = []
-    folder_count = 0
-    
-    def walk_folder(folder, depth=0):
-        nonlocal folder_count
-        folder_count += 1
+    backing = None
+    try:
+        fh = open(pst_path, "rb")
+        mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(mm, "madvise") and hasattr(mmap, "MADV_WILLNEED"):
+            mm.madvise(mmap.MADV_WILLNEED)  # prefault: we will read most of it
+        pst.open_file_object(mm)
+        backing = (mm, fh)
+    except Exception:
+        pst = pypff.file()
+        pst.open(pst_path)
+    try:
+        yield pst
+    finally:
+        pst.close()
+        if backing is not None:
+            mm, fh = backing
+            mm.close()
+            fh.close()
+
+def walk_subtree(folder, depth=0, stats=None, verbose=True):
+    """Yield message dicts from a folder subtree.
+
+    Iterative traversal: no recursion-depth limit on deeply nested
+    mailboxes and no per-folder frame overhead.
+    """
+    stack = deque([(folder, depth)])
+    while stack:
+        folder, depth = stack.pop()
+        if stats is not None:
+            stats["folders"] += 1
         name = safe_str(folder.get_name()) or "(unnamed)"
-        
-        # Skip common non-email folders
-        skip = ["calendar", "contacts", "tasks", "notes", "journal", "junk", "deleted"]
-        if any(s in name.lower() for s in skip):
-            return
-        
+
+        if _SKIP_FOLDER_RE.search(name):
+            continue
+
         msg_count = folder.get_number_of_sub_messages()
-        if msg_count > 0:
+        if msg_count > 0 and verbose:
             print(f"  {'  '*depth}📁 {name} ({msg_count} messages)")
-        
+
         for i in range(msg_count):
             try:
                 msg = folder.get_sub_message(i)
-                
-                sender = ""
-                try:
-                    sender = safe_str(msg.get_sender_name())
-                except:
-                    pass
-                
-                sender_email = ""
-                try:
-                    # Try different methods to get sender email
-                    for attr_name in ["sender_email_address", "sent_representing_email_address"]:
-                        try:
-                            val = getattr(msg, f"get_{attr_name}", lambda: None)()
-                            if val:
-                                sender_email = safe_str(val)
-                                break
-                        except:
-                            continue
-                except:
-                    pass
-                if not sender_email:
-                    sender_email = sender  # fallback
-                
-                subject = ""
-                try:
-                    subject = safe_str(msg.get_subject())
-                except:
-                    pass
-                
-                body = ""
-                try:
-                    body = safe_str(msg.get_plain_text_body())
-                except:
-                    try:
-                        body = safe_str(msg.get_html_body())
-                        # Strip HTML tags for analysis
-                        body = re.sub(r'<[^>]+>', ' ', body)
-                        body = re.sub(r'\s+', ' ', body).strip()
-                    except:
-                        pass
-                
-                recipients = []
-                try:
-                    for r in range(msg.get_number_of_recipients()):
-                        try:
-                            recip = msg.get_recipient(r)
-                            recip_email = safe_str(recip.get_email_address()) if recip else ""
-                            recip_name = safe_str(recip.get_name()) if recip else ""
-                            recipients.append(recip_email or recip_name)
-                        except:
-                            continue
-                except:
-                    pass
-                
-                dt = parse_date(msg)
-                
-                if body or subject:  # Only keep messages with content
-                    messages.append({
-                        "sender_name": sender,
-                        "sender_email": parse_email_address(sender_email),
-                        "recipients": [parse_email_address(r) for r in recipients if r],
-                        "subject": subject,
-                        "body": body[:5000],  # Cap body length
-                        "date": dt.isoformat() if dt else None,
-                        "date_obj": dt,
-                        "folder": name,
-                        "word_count": len(body.split()) if body else 0
-                    })
-            except Exception as e:
+                m = extract_message(msg, name)
+            except Exception:
                 continue
-        
+            del msg  # release the libpff handle before the generator suspends
+            if m:
+                yield m
+
         for j in range(folder.get_number_of_sub_folders()):
             try:
-                walk_folder(folder.get_sub_folder(j), depth + 1)
-            except:
+                stack.append((folder.get_sub_folder(j), depth + 1))
+            except Exception:
                 continue
-    
-    walk_folder(root)
-    pst.close()
-    
-    print(f"\n[*] Scanned {folder_count} folders, extracted {len(messages)} messages")
-    return messages
+
+def _extract_subtree_worker(args):
+    """Worker entry: open an independent pypff handle and walk one top-level folder."""
+    pst_path, index = args
+    with open_pst(pst_path) as pst:
+        folder = pst.get_root_folder().get_sub_folder(index)
+        return list(walk_subtree(folder, depth=1, verbose=False))
+
+def iter_messages(pst_path):
+    """Stream messages out of a PST file one at a time.
+
+    Yields dicts instead of building a list so a multi-GB PST never has
+    to fit every 5KB body in memory at once. With CLEARSIGNALS_WORKERS>1,
+    top-level folders are parsed in parallel worker processes.
+    """
+    print(f"\n[*] Opening PST file: {pst_path}")
+    extracted = 0
+    stats = {"folders": 0}
+
+    with open_pst(pst_path) as pst:
+        root = pst.get_root_folder()
+        n_top = root.get_number_of_sub_folders()
+        parallel = PST_WORKERS > 1 and n_top > 1
+        if parallel:
+            # Messages attached directly to the root (rare) stay in-process;
+            # workers open their own handles for the subtrees.
+            for i in range(root.get_number_of_sub_messages()):
+                try:
+                    msg = root.get_sub_message(i)
+                    m = extract_message(msg, "(root)")
+                except Exception:
+                    continue
+                if m:
+                    extracted += 1
+                    yield m
+        else:
+            for m in walk_subtree(root, stats=stats):
+                extracted += 1
+                yield m
+
+    if parallel:
+        print(f"[*] Parsing {n_top} top-level folders with {PST_WORKERS} workers...")
+        with ProcessPoolExecutor(max_workers=PST_WORKERS) as ex:
+            for msgs in ex.map(_extract_subtree_worker,
+                               [(pst_path, j) for j in range(n_top)]):
+                extracted += len(msgs)
+                yield from msgs
+        print(f"\n[*] Extracted {extracted} messages ({PST_WORKERS} workers)")
+        return
+
+    print(f"\n[*] Scanned {stats['folders']} folders, extracted {extracted} messages")
+
+@lru_cache(maxsize=8)
+def _sender_email_getters(msg_type):
+    """Resolve which sender-address accessors a pypff message type exposes.
+
+    Cached per type so the getattr probing runs once per file, not once
+    per message; the returned unbound methods are called directly in the
+    hot extract loop.
+    """
+    return tuple(
+        m for m in (
+            getattr(msg_type, "get_sender_email_address", None),
+            getattr(msg_type, "get_sent_representing_email_address", None),
+        ) if m is not None
+    )
+
+def extract_message(msg, folder_name):
+    """Pull the fields we care about from one PST message, or None if empty."""
+    sender = ""
+    try:
+        sender = safe_str(msg.get_sender_name())
+    except Exception:
+        pass
+
+    sender_email = ""
+    for getter in _sender_email_getters(type(msg)):
+        try:
+            val = getter(msg)
+        except Exception:
+            continue
+        if val:
+            sender_email = safe_str(val)
+            break
+    if not sender_email:
+        sender_email = sender  # fallback
+
+    subject = ""
+    try:
+        subject = safe_str(msg.get_subject())
+    except Exception:
+        pass
+
+    body = ""
+    try:
+        body = safe_str(msg.get_plain_text_body() or b"")
+    except Exception:
+        body = ""
+    if not body:
+        # Only messages with no plain text pay for HTML stripping; previously
+        # an empty (but successful) plain-text read skipped HTML entirely.
+        try:
+            html_body = safe_str(msg.get_html_body() or b"")
+        except Exception:
+            html_body = ""
+        if html_body:
+            body = strip_html(html_body)
+
+    recipients = []
+    try:
+        for r in range(msg.get_number_of_recipients()):
+            try:
+                recip = msg.get_recipient(r)
+                recip_email = safe_str(recip.get_email_address()) if recip else ""
+                recip_name = safe_str(recip.get_name()) if recip else ""
+                recipients.append(recip_email or recip_name)
+            except Exception:
+                continue
+    except Exception:
+        pass
+
+    dt = parse_date(msg)
+
+    if not (body or subject):  # Only keep messages with content
+        return None
+
+    return {
+        "sender_name": sender,
+        "sender_email": parse_email_address(sender_email),
+        "recipients": [parse_email_address(r) for r in recipients if r],
+        "subject": subject,
+        # Cap body length by tokens (chars without tiktoken) so CJK/emoji
+        # text can't blow past the prompt budget downstream
+        "body": truncate_tokens(body, BODY_TOKEN_CAP),
+        # Only the epoch float is stored; ISO strings are derived on
+        # demand via _iso_from_ts where output needs them.
+        "ts": dt.timestamp() if dt else None,
+        "folder": folder_name,
+        # Approximate: avoids allocating a word list per message, and the
+        # count is only ever used as a rough size signal
+        "word_count": (body.count(' ') + 1) if body else 0
+    }
 
 
 # ═══════════════════════════════════════════════════════════════
 # THREAD GROUPING
 # ═══════════════════════════════════════════════════════════════
 
+@lru_cache(maxsize=200_000)
 def normalize_subject(subject):
-    """Strip Re:/Fwd: prefixes to group threads."""
+    """Strip Re:/Fwd: prefixes to group threads. Cached - a mailbox has far
+    fewer unique subjects than messages."""
     s = subject or ""
-    s = re.sub(r'^(re|fw|fwd|aw|wg)\s*:\s*', '', s, flags=re.IGNORECASE)
-    s = re.sub(r'^(re|fw|fwd|aw|wg)\s*:\s*', '', s, flags=re.IGNORECASE)  # double strip
+    s = _RE_REPLY_PREFIX.sub('', s)
+    s = _RE_REPLY_PREFIX.sub('', s)  # double strip
     return s.strip().lower()
 
-def identify_user_email(messages):
+def identify_user_email(sender_counts):
     """Figure out which email address belongs to the PST owner (most frequent sender)."""
-    sender_counts = defaultdict(int)
-    for m in messages:
-        if m["sender_email"]:
-            sender_counts[m["sender_email"]] += 1
-    
     if not sender_counts:
         return ""
-    
+
     # The PST owner is typically the most frequent sender
-    user_email = max(sender_counts, key=sender_counts.get)
-    print(f"[*] Detected PST owner: {user_email} ({sender_counts[user_email]} sent messages)")
+    user_email, sent = sender_counts.most_common(1)[0]
+    print(f"[*] Detected PST owner: {user_email} ({sent} sent messages)")
     return user_email
 
-def group_into_contacts_and_threads(messages, user_email):
-    """Group messages by contact and thread."""
-    
+def group_into_contacts_and_threads(msg_iter):
+    """Group a stream of messages by contact and thread.
+
+    Consumes the message iterator in a single pass, bucketing by sender;
+    once the owner is known, their bucket is re-attributed to recipients.
+    Returns (contacts, user_email).
+    """
+    by_sender = defaultdict(list)
+    sender_counts = Counter()
+
+    for m in msg_iter:
+        if m["sender_email"]:
+            sender_counts[m["sender_email"]] += 1
+        by_sender[m["sender_email"]].append(m)
+
+    user_email = identify_user_email(sender_counts)
+
     # Identify all unique contacts (anyone who isn't the PST owner)
     contact_messages = defaultdict(list)  # contact_email -> [messages]
-    
-    for m in messages:
-        sender = m["sender_email"]
-        
+
+    # Each message lands in exactly one contact bucket (outbound attributes
+    # to the first non-self recipient only), so annotate in place rather
+    # than shallow-copying every ~15-field dict.
+    for sender, msgs in by_sender.items():
         if sender == user_email:
             # Outbound - attribute to recipients
-            for r in m["recipients"]:
-                if r and r != user_email:
-                    m_copy = dict(m)
-                    m_copy["direction"] = "outbound"
-                    m_copy["contact_email"] = r
-                    contact_messages[r].append(m_copy)
-                    break  # attribute to first non-self recipient
+            for m in msgs:
+                for r in m["recipients"]:
+                    if r and r != user_email:
+                        m["direction"] = "outbound"
+                        m["contact_email"] = r
+                        contact_messages[r].append(m)
+                        break  # attribute to first non-self recipient
         else:
             # Inbound
-            m_copy = dict(m)
-            m_copy["direction"] = "inbound"
-            m_copy["contact_email"] = sender
-            contact_messages[sender].append(m_copy)
-    
+            for m in msgs:
+                m["direction"] = "inbound"
+                m["contact_email"] = sender
+                contact_messages[sender].append(m)
+    by_sender.clear()
+
     print(f"[*] Found {len(contact_messages)} unique contacts")
     
     # For each contact, group into threads by subject
@@ -319,69 +575,94 @@ def group_into_contacts_and_threads(messages, user_email):
                 thread_key = "(no subject)"
             threads[thread_key].append(m)
         
-        # Sort threads by date, sort emails within threads by date
-        sorted_threads = []
+        # Sort emails within threads by date
+        contact_threads = []
         for subject, thread_msgs in threads.items():
-            thread_msgs.sort(key=lambda x: x["date_obj"] or datetime.min.replace(tzinfo=timezone.utc))
+            thread_msgs.sort(key=lambda x: x["ts"] or 0.0)
             if len(thread_msgs) >= 2:  # Only keep threads with back-and-forth
-                sorted_threads.append({
+                contact_threads.append({
                     "subject": subject,
                     "emails": thread_msgs[:MAX_EMAILS_PER_THREAD],
                     "email_count": len(thread_msgs),
-                    "started": thread_msgs[0]["date"],
-                    "ended": thread_msgs[-1]["date"]
+                    "started": _iso_from_ts(thread_msgs[0]["ts"]),
+                    "ended": _iso_from_ts(thread_msgs[-1]["ts"])
                 })
-        
-        sorted_threads.sort(key=lambda t: t["ended"] or "", reverse=True)
-        
-        if sorted_threads:
+
+        if contact_threads:
+            # Most recent N threads; nlargest is O(n log K) vs a full sort
+            recent = heapq.nlargest(MAX_THREADS_PER_CONTACT, contact_threads,
+                                    key=lambda t: t["ended"] or "")
             contacts[email] = {
                 "email": email,
                 "name": msgs[0].get("sender_name", "") if msgs[0]["direction"] == "inbound" else "",
                 "total_messages": len(msgs),
-                "total_threads": len(sorted_threads),
-                "threads": sorted_threads[:MAX_THREADS_PER_CONTACT]
+                "total_threads": len(contact_threads),
+                "threads": recent
             }
-    
-    # Sort contacts by message count, take top N
-    sorted_contacts = sorted(contacts.values(), key=lambda c: c["total_messages"], reverse=True)
-    sorted_contacts = sorted_contacts[:MAX_CONTACTS]
+
+    # Top contacts by message count, without sorting the full contact set
+    sorted_contacts = heapq.nlargest(MAX_CONTACTS, contacts.values(),
+                                     key=lambda c: c["total_messages"])
     
     print(f"[*] Selected top {len(sorted_contacts)} contacts by activity")
     for c in sorted_contacts[:10]:
         print(f"    {c['email'][:40]:40s} {c['total_messages']:4d} msgs, {c['total_threads']:3d} threads")
-    
-    return sorted_contacts
+
+    return sorted_contacts, user_email
 
 
 # ═══════════════════════════════════════════════════════════════
 # LLM ANALYSIS
 # ═══════════════════════════════════════════════════════════════
 
-def analyze_thread(thread, contact_context=""):
-    """Send a thread to the LLM for analysis."""
-    
-    # Format emails for the prompt
+def count_tokens(text):
+    """Token count via tiktoken, or a ~4 chars/token estimate without it."""
+    if _ENC is not None:
+        return len(_ENC.encode(text))
+    return max(1, len(text) // 4)
+
+def truncate_tokens(text, max_tokens):
+    """Token-aware truncation when tiktoken is present, char-based otherwise."""
+    if _ENC is not None:
+        toks = _ENC.encode(text)
+        if len(toks) <= max_tokens:
+            return text
+        return _ENC.decode(toks[:max_tokens])
+    return text[:max_tokens * 4]
+
+_SYS_PROMPT_TOKENS = count_tokens(SYS_PROMPT)
+
+def build_prompt(thread, contact_context=""):
+    """Format a thread into the user prompt sent to the LLM.
+
+    Emails are capped by tokens rather than characters and packed until
+    the request's input budget (context minus output reserve) is spent.
+    """
+    budget = CONTEXT_TOKENS - OUTPUT_RESERVE_TOKENS - _SYS_PROMPT_TOKENS - 100
+    used = 0
     email_texts = []
     for i, em in enumerate(thread["emails"]):
         direction = em.get("direction", "unknown")
-        date = em.get("date", "unknown")
+        date = _iso_from_ts(em.get("ts")) or "unknown"
         
         # Calculate response time
         resp_time = ""
-        if i > 0 and em.get("date_obj") and thread["emails"][i-1].get("date_obj"):
-            delta = em["date_obj"] - thread["emails"][i-1]["date_obj"]
-            hours = delta.total_seconds() / 3600
+        if i > 0 and em.get("ts") and thread["emails"][i-1].get("ts"):
+            hours = (em["ts"] - thread["emails"][i-1]["ts"]) / 3600
             resp_time = f" | Response time: {hours:.1f}h"
         
-        body = em.get("body", "")[:2000]  # Cap per-email
-        
-        email_texts.append(
+        body = truncate_tokens(em.get("body", ""), EMAIL_TOKEN_CAP)
+
+        block = (
             f"EMAIL {i+1} of {len(thread['emails'])}:\n"
             f"Direction: {direction} | Date: {date}{resp_time}\n"
             f"Subject: {thread['subject']}\n\n"
             f"{body}\n"
         )
+        used += count_tokens(block)
+        if email_texts and used > budget:
+            break  # budget spent; keep at least one email
+        email_texts.append(block)
     
     full_thread = "\n---\n\n".join(email_texts)
     
@@ -389,34 +670,57 @@ def analyze_thread(thread, contact_context=""):
     if contact_context:
         prompt += f"\nContext: {contact_context}"
     prompt += f"\n\n{full_thread}"
-    
+    return prompt
+
+def pick_model(thread):
+    """Route a thread to the cheap or premium model based on size."""
+    size = sum(len(e.get("body", "")) for e in thread["emails"])
+    if len(thread["emails"]) <= CHEAP_MAX_EMAILS or size < CHEAP_MAX_BYTES:
+        return CHEAP_MODEL_ID
+    return MODEL_ID
+
+def build_request_body(prompt, model=None):
+    """Build the chat-completions request payload for a prompt."""
+    return {
+        "model": model or MODEL_ID,
+        "max_tokens": 2000,
+        "messages": [
+            {"role": "system", "content": SYS_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+    }
+
+def parse_analysis(raw):
+    """Parse the JSON analysis out of an LLM response, stripping code fences."""
+    clean = raw.strip()
+    clean = _RE_FENCE_OPEN.sub('', clean)
+    clean = _RE_FENCE_CLOSE.sub('', clean)
+    return json.loads(clean)
+
+def analyze_thread(thread, contact_context=""):
+    """Send a thread to the LLM for analysis (serial fallback path)."""
+    prompt = build_prompt(thread, contact_context)
+    model = pick_model(thread)
+    ckey = cache_key(prompt, model)
+    cached = cache_get(ckey)
+    if cached is not None:
+        return cached
+
     try:
-        resp = requests.post(API_URL, headers={
-            "Authorization": f"Bearer {API_KEY}",
-            "Content-Type": "application/json"
-        }, json={
-            "model": MODEL_ID,
-            "max_tokens": 2000,
-            "messages": [
-                {"role": "system", "content": SYS_PROMPT},
-                {"role": "user", "content": prompt}
-            ]
-        }, timeout=60)
-        
+        RATE_LIMITER.wait()
+        resp = SESSION.post(API_URL, json=build_request_body(prompt, model), timeout=60)
+        RATE_LIMITER.feedback(resp.status_code, _retry_after_seconds(resp.headers))
+
         if resp.status_code != 200:
             print(f"    [!] API error {resp.status_code}: {resp.text[:200]}")
             return None
-        
+
         data = resp.json()
         raw = data.get("choices", [{}])[0].get("message", {}).get("content", "")
-        
-        # Parse JSON from response
-        clean = raw.strip()
-        clean = re.sub(r'^```json\s*', '', clean)
-        clean = re.sub(r'\s*```$', '', clean)
-        
-        return json.loads(clean)
-    
+        parsed = parse_analysis(raw)
+        cache_put(ckey, parsed)
+        return parsed
+
     except json.JSONDecodeError as e:
         print(f"    [!] JSON parse error: {e}")
         return None
@@ -425,51 +729,506 @@ def analyze_thread(thread, contact_context=""):
         return None
 
 
+_CACHE = diskcache.Cache(CACHE_DIR) if diskcache else None
+
+# Without diskcache, fall back to a stdlib shelve so reruns still hit the
+# cache. Entries are (expires_at, analysis); shelve isn't thread-safe, so
+# access is lock-guarded.
+_SHELF = None
+_SHELF_LOCK = threading.Lock()
+
+def _shelf():
+    global _SHELF
+    if _SHELF is None:
+        _SHELF = shelve.open(CACHE_DIR + ".shelf")
+    return _SHELF
+
+def cache_key(prompt, model=None):
+    """Content-addressed key: identical model + prompts hit the same entry."""
+    return hashlib.sha256(((model or MODEL_ID) + SYS_PROMPT + prompt).encode()).hexdigest()
+
+def cache_get(key):
+    if _CACHE is not None:
+        return _CACHE.get(key)
+    with _SHELF_LOCK:
+        rec = _shelf().get(key)
+    if rec and rec[0] > time.time():
+        return rec[1]
+    return None
+
+def cache_put(key, parsed):
+    if _CACHE is not None:
+        _CACHE.set(key, parsed, expire=CACHE_TTL_SECONDS)
+        return
+    with _SHELF_LOCK:
+        shelf = _shelf()
+        shelf[key] = (time.time() + CACHE_TTL_SECONDS, parsed)
+        shelf.sync()
+
+def thread_key(contact_email, thread):
+    """Stable checkpoint key for one (contact, thread) pair."""
+    return hash_id(contact_email + "|" + thread["subject"] + "|" + (thread["started"] or ""))
+
+
+class Checkpoint:
+    """Append-only JSONL record of completed analyses, for crash-safe resume."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                        self.done[rec["key"]] = rec["analysis"]
+                    except (json.JSONDecodeError, KeyError):
+                        continue  # tolerate a torn final line from a crash
+        self._fh = open(path, "a", encoding="utf-8")
+
+    def record(self, key, analysis):
+        with self._lock:
+            self._fh.write(json.dumps({"key": key, "analysis": analysis}, default=str) + "\n")
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            self.done[key] = analysis
+
+
+def analyze_threads_batch(threads):
+    """Analyze several threads with one LLM call.
+
+    Returns a list of analyses in thread order, or None if the combined
+    response can't be parsed into one analysis per thread (caller falls
+    back to per-thread calls). Saves a round-trip and the system-prompt
+    tokens for every thread after the first.
+    """
+    n = len(threads)
+    if n == 1:
+        return [analyze_thread(threads[0])]
+
+    sections = [f"=== THREAD {i+1} ===\n{build_prompt(t)}" for i, t in enumerate(threads)]
+    prompt = (f"Analyze the following {n} independent email threads. Return ONLY a JSON "
+              f"array with exactly {n} analysis objects in the same order, each using "
+              f"the usual schema.\n\n" + "\n\n".join(sections))
+    # Only route the whole batch cheap if every member would go cheap alone
+    model = MODEL_ID if any(pick_model(t) == MODEL_ID for t in threads) else CHEAP_MODEL_ID
+
+    ckey = cache_key(prompt, model)
+    cached = cache_get(ckey)
+    if isinstance(cached, list) and len(cached) == n:
+        return cached
+
+    try:
+        RATE_LIMITER.wait()
+        body = build_request_body(prompt, model)
+        body["max_tokens"] = 2000 * n
+        resp = SESSION.post(API_URL, json=body, timeout=120)
+        RATE_LIMITER.feedback(resp.status_code, _retry_after_seconds(resp.headers))
+
+        if resp.status_code != 200:
+            print(f"    [!] API error {resp.status_code}: {resp.text[:200]}")
+            return None
+
+        raw = resp.json().get("choices", [{}])[0].get("message", {}).get("content", "")
+        parsed = parse_analysis(raw)
+        if not isinstance(parsed, list) or len(parsed) != n:
+            print("    [!] Batched response shape mismatch - falling back to per-thread calls")
+            return None
+        cache_put(ckey, parsed)
+        return parsed
+
+    except Exception as e:
+        print(f"    [!] Batched call failed: {e}")
+        return None
+
+
+class RateLimiter:
+    """Additive-increase/multiplicative-decrease request pacing.
+
+    Callers wait() (or wait_async()) before each request and report the
+    response via feedback(). Healthy responses nudge the rate up by
+    0.1 req/s; a 429/5xx halves it and any Retry-After delay is honored
+    by all senders. Replaces the fixed per-call sleep: healthy runs ramp
+    up instead of idling, and rate-limited runs back off instead of
+    retry-storming. Safe to share across threads and the event loop.
+    """
+
+    def __init__(self, rate=REQUESTS_PER_SECOND):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._next_at = time.monotonic()
+        self._pause_until = 0.0
+
+    def _reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            at = max(self._next_at, self._pause_until, now)
+            self._next_at = at + 1.0 / self.rate
+            return at - now
+
+    def wait(self):
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self):
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def feedback(self, status, retry_after=None):
+        with self._lock:
+            if status == 429 or status >= 500:
+                self.rate = max(MIN_REQUESTS_PER_SECOND, self.rate / 2)
+                if retry_after:
+                    self._pause_until = time.monotonic() + retry_after
+            else:
+                self.rate = min(MAX_REQUESTS_PER_SECOND, self.rate + 0.1)
+
+
+RATE_LIMITER = RateLimiter()
+
+def _retry_after_seconds(headers):
+    try:
+        return float(headers.get("retry-after") or 0) or None
+    except (TypeError, ValueError):
+        return None
+
+async def analyze_thread_async(session, thread, sem, limiter, contact_context=""):
+    """Async analysis of one thread, bounded by semaphore + rate limiter."""
+    prompt = build_prompt(thread, contact_context)
+    model = pick_model(thread)
+    ckey = cache_key(prompt, model)
+    cached = cache_get(ckey)
+    if cached is not None:
+        return cached
+
+    async with sem:
+        for attempt in range(API_RETRIES):
+            await limiter.wait_async()
+            try:
+                async with session.post(API_URL, headers={
+                    "Authorization": f"Bearer {API_KEY}",
+                    "Content-Type": "application/json"
+                }, json=build_request_body(prompt, model),
+                        timeout=aiohttp.ClientTimeout(total=60)) as resp:
+                    limiter.feedback(resp.status, _retry_after_seconds(resp.headers))
+                    if resp.status == 429 or resp.status >= 500:
+                        await asyncio.sleep(2 ** attempt)
+                        continue
+                    if resp.status != 200:
+                        text = await resp.text()
+                        print(f"    [!] API error {resp.status}: {text[:200]}")
+                        return None
+                    data = await resp.json()
+
+                raw = data.get("choices", [{}])[0].get("message", {}).get("content", "")
+                parsed = parse_analysis(raw)
+                cache_put(ckey, parsed)
+                return parsed
+
+            except json.JSONDecodeError as e:
+                print(f"    [!] JSON parse error: {e}")
+                return None
+            except Exception as e:
+                if attempt == API_RETRIES - 1:
+                    print(f"    [!] API call failed: {e}")
+                    return None
+                await asyncio.sleep(2 ** attempt)
+    return None
+
+def analyze_threads_batch_api(pending):
+    """Submit all pending threads as one Batch API job and poll for results.
+
+    Returns {key: analysis} for completed requests, or None if the batch
+    could not run (caller falls back to live calls).
+    """
+    lines = []
+    for _, _, key, thread in pending:
+        lines.append(json.dumps({
+            "custom_id": key,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": build_request_body(build_prompt(thread), pick_model(thread))
+        }))
+
+    try:
+        # Content-Type: None lets requests set the multipart boundary instead
+        # of the session's default application/json
+        resp = SESSION.post(f"{API_BASE}/files", headers={"Content-Type": None},
+                             files={"file": ("clearsignals_batch.jsonl",
+                                             "\n".join(lines), "application/jsonl")},
+                             data={"purpose": "batch"}, timeout=120)
+        resp.raise_for_status()
+        file_id = resp.json()["id"]
+
+        resp = SESSION.post(f"{API_BASE}/batches", json={
+            "input_file_id": file_id,
+            "endpoint": "/v1/chat/completions",
+            "completion_window": "24h"
+        }, timeout=60)
+        resp.raise_for_status()
+        batch_id = resp.json()["id"]
+    except Exception as e:
+        print(f"    [!] Batch submit failed ({e}) - falling back to live calls.")
+        return None
+
+    print(f"[*] Batch {batch_id} submitted ({len(pending)} threads); polling every {BATCH_POLL_SECONDS}s...")
+    while True:
+        time.sleep(BATCH_POLL_SECONDS)
+        try:
+            batch = SESSION.get(f"{API_BASE}/batches/{batch_id}", timeout=60).json()
+        except Exception as e:
+            print(f"    [!] Poll failed: {e}")
+            continue
+        status = batch.get("status", "unknown")
+        if status in ("completed", "failed", "expired", "cancelled"):
+            break
+        counts = batch.get("request_counts", {})
+        print(f"    status={status} done={counts.get('completed', 0)}/{counts.get('total', len(pending))}")
+
+    if status != "completed" or not batch.get("output_file_id"):
+        print(f"    [!] Batch ended with status '{status}' - falling back to live calls.")
+        return None
+
+    out = SESSION.get(f"{API_BASE}/files/{batch['output_file_id']}/content", timeout=120)
+    results = {}
+    for line in out.text.splitlines():
+        try:
+            rec = json.loads(line)
+            raw = (rec.get("response", {}).get("body", {})
+                      .get("choices", [{}])[0].get("message", {}).get("content", ""))
+            results[rec["custom_id"]] = parse_analysis(raw)
+        except Exception:
+            continue  # individual failures fall back to live calls
+    return results
+
+async def _run_one(session, thread, sem, limiter, key, checkpoint):
+    analysis = await analyze_thread_async(session, thread, sem, limiter)
+    if analysis is not None and checkpoint:
+        checkpoint.record(key, analysis)
+    return analysis
+
+async def _gather_analyses(pairs, checkpoint):
+    """Run analyze_thread_async over all pending (key, thread) pairs."""
+    sem = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    limiter = RATE_LIMITER
+    async with aiohttp.ClientSession() as session:
+        tasks = [_run_one(session, thread, sem, limiter, key, checkpoint)
+                 for _, _, key, thread in pairs]
+        return await asyncio.gather(*tasks)
+
+def submit_threads(pending, checkpoint=None):
+    """Fan (ci, ti, key, thread) work across a bounded thread pool.
+
+    Concurrency fallback for when aiohttp isn't installed: analyze_thread
+    is network-bound, so worker threads overlap the HTTP latency while
+    the shared RATE_LIMITER paces the actual requests.
+    """
+    results = {}
+    workers = min(MAX_CONCURRENT_REQUESTS, len(pending))
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        futures = {}
+        for ci, ti, key, thread in pending:
+            futures[ex.submit(analyze_thread, thread)] = (ci, ti, key)
+        for fut in as_completed(futures):
+            ci, ti, key = futures[fut]
+            try:
+                analysis = fut.result()
+            except Exception as e:
+                print(f"    [!] Worker failed: {e}")
+                analysis = None
+            if analysis is not None and checkpoint:
+                checkpoint.record(key, analysis)
+            results[(ci, ti)] = analysis
+    return results
+
+def analyze_all_threads(contacts, checkpoint=None):
+    """Analyze every thread for every contact; returns {(ci, ti): analysis}.
+
+    Uses concurrent aiohttp requests when available, otherwise falls back to
+    the serial rate-limited loop. Threads already present in the checkpoint
+    are skipped so an interrupted run never re-spends on completed calls.
+    """
+    pairs = [(ci, ti, thread_key(contact["email"], thread), thread)
+             for ci, contact in enumerate(contacts)
+             for ti, thread in enumerate(contact["threads"])]
+
+    results = {}
+    pending = []
+    for ci, ti, key, thread in pairs:
+        if checkpoint and key in checkpoint.done:
+            results[(ci, ti)] = checkpoint.done[key]
+        else:
+            pending.append((ci, ti, key, thread))
+
+    if checkpoint and len(pending) < len(pairs):
+        print(f"\n[*] Resuming: {len(pairs) - len(pending)} threads loaded from checkpoint.")
+
+    if not pending:
+        return results
+
+    if BATCH_MODE:
+        batch_results = analyze_threads_batch_api(pending)
+        if batch_results:
+            still_pending = []
+            for ci, ti, key, thread in pending:
+                if key in batch_results:
+                    results[(ci, ti)] = batch_results[key]
+                    if checkpoint:
+                        checkpoint.record(key, batch_results[key])
+                else:
+                    still_pending.append((ci, ti, key, thread))
+            pending = still_pending
+            if not pending:
+                return results
+
+    if THREADS_PER_CALL > 1:
+        groups = [pending[i:i + THREADS_PER_CALL]
+                  for i in range(0, len(pending), THREADS_PER_CALL)]
+        print(f"\n[*] Analyzing {len(pending)} threads in {len(groups)} batched calls...")
+        still_pending = []
+        with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_REQUESTS, len(groups))) as ex:
+            futures = {ex.submit(analyze_threads_batch,
+                                 [t for _, _, _, t in group]): group
+                       for group in groups}
+            for fut in as_completed(futures):
+                group = futures[fut]
+                try:
+                    analyses = fut.result()
+                except Exception:
+                    analyses = None
+                if analyses is None:
+                    still_pending.extend(group)  # retried below, one call each
+                    continue
+                for (ci, ti, key, thread), analysis in zip(group, analyses):
+                    if analysis is not None and checkpoint:
+                        checkpoint.record(key, analysis)
+                    results[(ci, ti)] = analysis
+        pending = still_pending
+        if not pending:
+            return results
+
+    if aiohttp is not None:
+        print(f"\n[*] Analyzing {len(pending)} threads ({MAX_CONCURRENT_REQUESTS} concurrent)...")
+        analyses = asyncio.run(_gather_analyses(pending, checkpoint))
+        for (ci, ti, _, _), analysis in zip(pending, analyses):
+            results[(ci, ti)] = analysis
+    else:
+        workers = min(MAX_CONCURRENT_REQUESTS, len(pending))
+        print(f"\n[*] Analyzing {len(pending)} threads ({workers} worker threads)...")
+        results.update(submit_threads(pending, checkpoint))
+
+    return results
+
+
 # ═══════════════════════════════════════════════════════════════
 # PROFILE BUILDING
 # ═══════════════════════════════════════════════════════════════
 
+if njit is not None and np is not None:
+    @njit(cache=True)
+    def _mean_of_segments(values, offsets):
+        n = offsets.shape[0] - 1
+        total = 0.0
+        for i in range(n):
+            lo, hi = offsets[i], offsets[i + 1]
+            if hi > lo:
+                s = 0.0
+                for j in range(lo, hi):
+                    s += values[j]
+                total += s / (hi - lo)
+        return total / n if n > 0 else 0.0
+else:
+    _mean_of_segments = None
+
+def mean_of_trajectories(traj_lists):
+    """Mean over threads of each thread's mean score.
+
+    Dispatches to a numba-compiled kernel when numba is installed, or to
+    NumPy segment reductions with numpy alone; the pure-Python reduction
+    at the bottom is the reference behavior.
+    """
+    n = len(traj_lists)
+    if n == 0:
+        return 0.0
+    if _mean_of_segments is not None:
+        values = np.array([v for t in traj_lists for v in t], dtype=np.float64)
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum([len(t) for t in traj_lists], out=offsets[1:])
+        return float(_mean_of_segments(values, offsets))
+    if np is not None:
+        nonempty = [t for t in traj_lists if t]
+        if not nonempty:
+            return 0.0
+        values = np.fromiter((v for t in nonempty for v in t), dtype=np.float64)
+        lens = np.array([len(t) for t in nonempty], dtype=np.int64)
+        starts = np.zeros(len(lens), dtype=np.int64)
+        np.cumsum(lens[:-1], out=starts[1:])
+        return float((np.add.reduceat(values, starts) / lens).sum() / n)
+    return sum(sum(t) / max(len(t), 1) for t in traj_lists) / n
+
 def build_profile(contact, analyses):
     """Build an anonymized interaction profile from analysis results."""
     
     threads_data = []
-    all_signals = []
     intents = []
     win_pcts = []
-    
+
+    # Aggregate counters accumulated in the same pass that builds the
+    # thread data - no re-walks over trajectories or signals afterwards
+    r_total = y_total = g_total = 0
+    total_signals = 0
+    cultural_violations = 0
+    competitive_mentions = 0
+
     for thread, analysis in zip(contact["threads"], analyses):
         if not analysis:
             continue
-        
-        # Build trajectory
+
+        # Build trajectory (and the score lists, in the same walk)
         trajectory = []
+        formality_traj = []
+        warmth_traj = []
         for t in analysis.get("trajectory", []):
+            formality = t.get("formality", 5)
+            warmth = t.get("warmth", 5)
             trajectory.append({
                 "email_index": t.get("email_num", 0),
                 "direction": t.get("direction", "unknown"),
                 "intent_score": t.get("intent", 5),
                 "win_likelihood_pct": t.get("win_pct", 50),
-                "formality_score": t.get("formality", 5),
-                "warmth_score": t.get("warmth", 5),
+                "formality_score": formality,
+                "warmth_score": warmth,
             })
-        
+            formality_traj.append(formality)
+            warmth_traj.append(warmth)
+
         # Build signals (already generic from LLM)
         signals = []
         for s in analysis.get("signals", []):
+            sig_type = s.get("type", "unknown")
+            severity = s.get("severity", "yellow")
             signals.append({
                 "email_index": s.get("email_num", 0),
-                "type": s.get("type", "unknown"),
-                "severity": s.get("severity", "yellow"),
+                "type": sig_type,
+                "severity": severity,
                 "description": s.get("description", ""),  # Already PII-free from prompt
             })
-            all_signals.append(s)
-        
-        # Extract trajectories
-        formality_traj = [t.get("formality", 5) for t in analysis.get("trajectory", [])]
-        warmth_traj = [t.get("warmth", 5) for t in analysis.get("trajectory", [])]
-        
+            total_signals += 1
+            if sig_type == "cultural" and severity == "red":
+                cultural_violations += 1
+            elif sig_type == "competitive":
+                competitive_mentions += 1
+
+        ryg = analysis.get("ryg", {})
+        r_total += ryg.get("r", 0)
+        y_total += ryg.get("y", 0)
+        g_total += ryg.get("g", 0)
+
         threads_data.append({
-            "thread_hash": sha256(thread["subject"] + (thread["started"] or "")),
+            "thread_hash": hash_id(thread["subject"] + (thread["started"] or "")),
             "started_at": thread["started"],
             "ended_at": thread["ended"],
             "email_count": len(thread["emails"]),
@@ -492,12 +1251,7 @@ def build_profile(contact, analyses):
     
     if not threads_data:
         return None
-    
-    # Calculate aggregate
-    r_total = sum(t["final_scores"]["ryg_total"].get("r", 0) for t in threads_data)
-    y_total = sum(t["final_scores"]["ryg_total"].get("y", 0) for t in threads_data)
-    g_total = sum(t["final_scores"]["ryg_total"].get("g", 0) for t in threads_data)
-    
+
     # Determine trend
     if len(intents) >= 2:
         trend = "improving" if intents[-1] > intents[0] else "declining" if intents[-1] < intents[0] else "stable"
@@ -513,11 +1267,11 @@ def build_profile(contact, analyses):
     
     profile = {
         "schema_version": "1.0",
-        "profile_id": sha256(contact["email"] + str(time.time())),
+        "profile_id": hash_id(contact["email"] + str(time.time())),
         "created_at": datetime.now(timezone.utc).isoformat(),
         "contact": {
-            "hash_id": sha256(contact["email"]),
-            "company_hash": sha256(email_domain),
+            "hash_id": hash_id(contact["email"]),
+            "company_hash": hash_id(email_domain),
             "role_category": "unknown",
             "department_category": "unknown",
             "region": "unknown",
@@ -525,17 +1279,17 @@ def build_profile(contact, analyses):
         },
         "baseline": {
             "established_from_threads": len(threads_data),
-            "formality_mean": round(sum(sum(t["formality_trajectory"]) / max(len(t["formality_trajectory"]), 1) for t in threads_data) / max(len(threads_data), 1), 1),
-            "warmth_mean": round(sum(sum(t["warmth_trajectory"]) / max(len(t["warmth_trajectory"]), 1) for t in threads_data) / max(len(threads_data), 1), 1),
+            "formality_mean": round(mean_of_trajectories([t["formality_trajectory"] for t in threads_data]), 1),
+            "warmth_mean": round(mean_of_trajectories([t["warmth_trajectory"] for t in threads_data]), 1),
         },
         "threads": threads_data,
         "aggregate_scores": {
             "relationship_health": health,
             "trend_direction": trend,
             "total_threads": len(threads_data),
-            "total_signals": len(all_signals),
-            "cultural_violation_count": sum(1 for s in all_signals if s.get("type") == "cultural" and s.get("severity") == "red"),
-            "competitive_mention_count": sum(1 for s in all_signals if s.get("type") == "competitive"),
+            "total_signals": total_signals,
+            "cultural_violation_count": cultural_violations,
+            "competitive_mention_count": competitive_mentions,
             "avg_intent": round(avg_intent, 1),
             "avg_win_pct": round(sum(win_pcts) / len(win_pcts), 1) if win_pcts else 50,
             "ryg_total": {"r": r_total, "y": y_total, "g": g_total}
@@ -570,6 +1324,21 @@ def build_raw_output(contact, analyses):
     }
 
 
+# ═══════════════════════════════════════════════════════════════
+# OUTPUT
+# ═══════════════════════════════════════════════════════════════
+
+def dump_json(path, obj, indent=True):
+    """Write a JSON file, using orjson's C encoder when available."""
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2 if indent else 0
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(obj, option=option, default=str))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(obj, f, indent=2 if indent else None, default=str)
+
+
 # ═══════════════════════════════════════════════════════════════
 # MAIN
 # ═══════════════════════════════════════════════════════════════
@@ -603,17 +1372,9 @@ def main():
     print(f"[*] Max contacts: {MAX_CONTACTS}")
     print(f"[*] Max threads per contact: {MAX_THREADS_PER_CONTACT}")
     
-    # Step 1: Parse PST
-    messages = extract_messages(pst_path)
-    
-    if not messages:
-        print("\n[!] No messages found in PST file.")
-        sys.exit(1)
-    
-    # Step 2: Identify user and group
-    user_email = identify_user_email(messages)
-    contacts = group_into_contacts_and_threads(messages, user_email)
-    
+    # Steps 1+2: Stream the PST straight into contact/thread grouping
+    contacts, user_email = group_into_contacts_and_threads(iter_messages(pst_path))
+
     if not contacts:
         print("\n[!] No contacts with threaded conversations found.")
         sys.exit(1)
@@ -625,21 +1386,24 @@ def main():
     
     all_profiles = []
     all_raw = []
-    total_threads = sum(len(c["threads"]) for c in contacts)
     analyzed = 0
-    
+
+    output_dir = os.path.dirname(os.path.abspath(pst_path))
+    checkpoint = Checkpoint(os.path.join(output_dir, "clearsignals_checkpoint.jsonl"))
+    results = analyze_all_threads(contacts, checkpoint)
+
     for ci, contact in enumerate(contacts):
         print(f"\n[{ci+1}/{len(contacts)}] {contact['email']}")
         print(f"         {len(contact['threads'])} threads, {contact['total_messages']} total messages")
-        
+
         analyses = []
         for ti, thread in enumerate(contact["threads"]):
             analyzed += 1
             print(f"  Thread {ti+1}/{len(contact['threads'])}: \"{thread['subject'][:50]}\" ({len(thread['emails'])} emails) ", end="")
-            
-            analysis = analyze_thread(thread)
+
+            analysis = results.get((ci, ti))
             analyses.append(analysis)
-            
+
             if analysis:
                 intent = analysis.get("final_intent", "?")
                 win = analysis.get("final_win_pct", "?")
@@ -647,9 +1411,7 @@ def main():
                 print(f"→ Intent:{intent}/10 Win:{win}% R:{ryg.get('r',0)} Y:{ryg.get('y',0)} G:{ryg.get('g',0)}")
             else:
                 print("→ [failed]")
-            
-            time.sleep(RATE_LIMIT_SECONDS)
-        
+
         # Build profile
         profile = build_profile(contact, analyses)
         if profile:
@@ -661,55 +1423,58 @@ def main():
         print(f"  ✓ {contact['email']}: health={profile['aggregate_scores']['relationship_health'] if profile else 'N/A'}")
     
     # Step 4: Output
-    output_dir = os.path.dirname(os.path.abspath(pst_path))
-    
     # Anonymized profiles (safe to sync to cloud)
     profiles_path = os.path.join(output_dir, "clearsignals_profiles.json")
-    with open(profiles_path, "w", encoding="utf-8") as f:
-        json.dump({
-            "schema_version": "1.0",
-            "generated_at": datetime.now(timezone.utc).isoformat(),
-            "generator": "clearsignals_pst_analyzer_v1",
-            "contact_count": len(all_profiles),
-            "profiles": all_profiles
-        }, f, indent=2, default=str)
-    
-    # Raw output (LOCAL ONLY - contains PII)
+    dump_json(profiles_path, {
+        "schema_version": "1.0",
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "generator": "clearsignals_pst_analyzer_v1",
+        "contact_count": len(all_profiles),
+        "profiles": all_profiles
+    })
+
+    # Raw output (LOCAL ONLY - contains PII); machine-read, so no pretty-print
     raw_path = os.path.join(output_dir, "clearsignals_raw.json")
-    with open(raw_path, "w", encoding="utf-8") as f:
-        json.dump({
-            "WARNING": "THIS FILE CONTAINS PII - DO NOT UPLOAD OR SHARE",
-            "generated_at": datetime.now(timezone.utc).isoformat(),
-            "pst_owner": user_email,
-            "contacts_analyzed": len(all_raw),
-            "contacts": all_raw
-        }, f, indent=2, default=str)
+    dump_json(raw_path, {
+        "WARNING": "THIS FILE CONTAINS PII - DO NOT UPLOAD OR SHARE",
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "pst_owner": user_email,
+        "contacts_analyzed": len(all_raw),
+        "contacts": all_raw
+    }, indent=False)
     
     # Also create a dashboard-compatible format
     dashboard_path = os.path.join(output_dir, "clearsignals_dashboard.json")
     dashboard_contacts = []
+    # Accumulate the metadata totals while building the payload rather
+    # than re-walking contacts -> threads -> emails afterwards.
+    total_emails = 0
+    total_signals = 0
     for profile, raw_entry in zip(all_profiles, all_raw):
         # Merge just enough for the dashboard to display nicely
-        dashboard_contacts.append({
-            "contact_id": profile["contact"]["hash_id"][:8].upper(),
-            "name": f"Contact {profile['contact']['hash_id'][:6].upper()}",
-            "threads": [{
+        contact_hash = profile["contact"]["hash_id"]
+        dash_threads = []
+        for t in profile["threads"]:
+            emails = [{
+                "direction": traj.get("direction", "unknown"),
+                "date": t.get("started_at", ""),
+                "subject": "(redacted)",
+                "greeting": "",
+                "body": f"[Email {traj['email_index']} - {traj.get('direction','?')} - content processed locally]",
+                "signoff": "",
+                "formality_score": traj.get("formality_score", 5),
+                "warmth_score": traj.get("warmth_score", 5),
+                "word_count": 0,
+                "from": contact_hash[:8] if traj.get("direction") == "inbound" else "you",
+                "to": "you" if traj.get("direction") == "inbound" else contact_hash[:8],
+                "cc": [],
+                "response_time_hours": None
+            } for traj in t.get("trajectory", [])]
+            total_emails += len(emails)
+            total_signals += len(t["signals"])
+            dash_threads.append({
                 "thread_id": t["thread_hash"],
-                "emails": [{
-                    "direction": traj.get("direction", "unknown"),
-                    "date": t.get("started_at", ""),
-                    "subject": "(redacted)",
-                    "greeting": "",
-                    "body": f"[Email {traj['email_index']} - {traj.get('direction','?')} - content processed locally]",
-                    "signoff": "",
-                    "formality_score": traj.get("formality_score", 5),
-                    "warmth_score": traj.get("warmth_score", 5),
-                    "word_count": 0,
-                    "from": profile["contact"]["hash_id"][:8] if traj.get("direction") == "inbound" else "you",
-                    "to": "you" if traj.get("direction") == "inbound" else profile["contact"]["hash_id"][:8],
-                    "cc": [],
-                    "response_time_hours": None
-                } for traj in t.get("trajectory", [])],
+                "emails": emails,
                 "answer_key": {
                     "expected_final_readiness": t["final_scores"]["intent"],
                     "intent_signals": [s for s in t["signals"] if s["type"] == "intent"],
@@ -718,19 +1483,22 @@ def main():
                     "formality_shifts": [s for s in t["signals"] if s["type"] == "formality"],
                     "relationship_drift": [s for s in t["signals"] if s["type"] == "drift"]
                 }
-            } for t in profile["threads"]]
+            })
+        dashboard_contacts.append({
+            "contact_id": contact_hash[:8].upper(),
+            "name": f"Contact {contact_hash[:6].upper()}",
+            "threads": dash_threads
         })
-    
-    with open(dashboard_path, "w", encoding="utf-8") as f:
-        json.dump({
-            "metadata": {
-                "total_contacts": len(dashboard_contacts),
-                "total_emails": sum(len(e) for c in dashboard_contacts for t in c["threads"] for e in [t["emails"]]),
-                "total_signals": sum(len(s) for p in all_profiles for t in p["threads"] for s in [t["signals"]]),
-                "generated_from": "pst_analyzer"
-            },
-            "contacts": dashboard_contacts
-        }, f, indent=2, default=str)
+
+    dump_json(dashboard_path, {
+        "metadata": {
+            "total_contacts": len(dashboard_contacts),
+            "total_emails": total_emails,
+            "total_signals": total_signals,
+            "generated_from": "pst_analyzer"
+        },
+        "contacts": dashboard_contacts
+    })
     
     # Summary
     print(f"\n{'='*60}")